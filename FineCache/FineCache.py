@@ -5,43 +5,115 @@ import json
 import shutil
 import subprocess
 import types
+import weakref
 from collections import defaultdict
 from contextlib import ContextDecorator
 from datetime import datetime
-from functools import wraps
-from typing import Callable
+from functools import wraps, cached_property, update_wrapper
+from pathlib import Path
+from typing import Callable, Optional, Union
 
 from FineCache.CachedCall import CachedCall, PickleAgent
-from FineCache.utils import IncrementDir, get_default_filename
+from FineCache.utils import IncrementDir, KeyMemo, get_default_filename, setup_logger
 
 import logging
 
 logger = logging.getLogger(__name__)
 
+# 存活的 FineCache 对象，在 fork 前解析其实验文件夹，使 fork 出的子进程共享同一文件夹
+_instances = weakref.WeakSet()
+
+
+def _resolve_before_fork():
+    for fc in list(_instances):
+        try:
+            fc.dir
+        except Exception as e:
+            logger.warning(f'Failed to resolve experiment dir before fork: {e}')
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(before=_resolve_before_fork)
+
 
 class FineCache:
+    # 子进程可通过此环境变量挂载到父进程已创建的实验文件夹，格式为 "{pid}:{dir}"
+    ENV_KEY = 'FINECACHE_EXP_DIR'
+
     def __init__(self, base_path=None, template: str = "exp{id}", **kwargs):
         """
+        初始化时不会创建文件夹或调用git，实验文件夹与git信息在首次使用时才获取。
+        若在首次使用前 fork，则在 fork 前于父进程中创建实验文件夹，子进程共享该文件夹。
+
         :param base_path: 保存的文件夹，默认为当前文件夹。
         :param template: IncrementDir的模板串。
         """
         super().__init__()
+        setup_logger()
         self.base_path: str = base_path if base_path else os.path.abspath(os.getcwd())
+        self.template = template
+        self.template_kwargs = kwargs
+
+        self.tracking_files = []
+        _instances.add(self)
+
+    @cached_property
+    def base_dir(self) -> IncrementDir:
         os.makedirs(self.base_path, exist_ok=True)
+        return IncrementDir(self.base_path, self.template)
+
+    def _attached_dir(self) -> Optional[Path]:
+        """
+        解析其它进程通过 export_env 导出的实验文件夹。仅当其直接位于本对象的 base_path 下且名称符合模板时挂载。
 
-        self.base_dir = IncrementDir(self.base_path, template)
-        self.dir = self.base_dir.new_path(**kwargs)
-        os.makedirs(self.dir, exist_ok=True)
+        :return: 应挂载的实验文件夹，无法挂载时返回None。
+        """
+        handle = os.environ.get(self.ENV_KEY)
+        if not handle:
+            return None
+        pid, _, exp_dir = handle.partition(':')
+        if not pid.isdigit() or not exp_dir:
+            logger.warning(f'Ignore malformed {self.ENV_KEY}: {handle}')
+            return None
+        if int(pid) == os.getpid():
+            return None
+        exp_dir = Path(os.path.abspath(exp_dir))
+        if exp_dir.parent != Path(os.path.abspath(self.base_path)):
+            return None
+        if not self.base_dir.match_name(exp_dir.name, **self.template_kwargs):
+            return None
+        return exp_dir
 
-        self.tracking_files = []
-        self.information = {}
+    @cached_property
+    def dir(self) -> Path:
+        """
+        实验文件夹。若环境变量中有其它进程导出的、位于 base_path 下且符合模板的实验文件夹，则直接挂载，否则新建文件夹。
+        """
+        exp_dir = self._attached_dir()
+        if exp_dir is not None:
+            logger.debug(f'Attach to experiment dir: {exp_dir}')
+            os.makedirs(self.base_path, exist_ok=True)
+        else:
+            exp_dir = self.base_dir.new_path(**self.template_kwargs)
+        os.makedirs(exp_dir, exist_ok=True)
+        return exp_dir
 
+    @cached_property
+    def information(self) -> dict:
+        information = {}
         # 获取当前的commit hash
         result = subprocess.run(['git', 'rev-parse', 'HEAD', '--show-toplevel'], stdout=subprocess.PIPE,
                                 encoding='utf-8', text=True)
         commit_hash, project_root = result.stdout.strip().split('\n')
-        self.information['commit'] = commit_hash
-        self.information['project_root'] = project_root
+        information['commit'] = commit_hash
+        information['project_root'] = project_root
+        return information
+
+    def export_env(self):
+        """
+        将实验文件夹写入环境变量，使之后启动的子进程（如DataLoader的worker）挂载到同一实验文件夹，而不是新建文件夹。
+        """
+        os.environ[self.ENV_KEY] = f'{os.getpid()}:{os.path.abspath(self.dir)}'
 
     def _location(self, filename, in_dir):
         if in_dir:
@@ -63,19 +135,31 @@ class FineCache:
             patch_file.write(patch_content)
         self.information['patch_time'] = str(datetime.now())
 
-    def cache(self, filename_hash: Callable = get_default_filename, in_dir=True):
+    def cache(self, filename_hash: Callable = get_default_filename, in_dir=True,
+              key_memo: Union[KeyMemo, bool, None] = None):
         """
         缓存装饰函数的调用结果。每次调用时，检查是否存在已缓存结果，如果存在则直接给出缓存结果。
+
+        :param key_memo: 为True或KeyMemo对象时，记忆默认文件名中各参数的哈希值。
         """
+        if key_memo is True:
+            key_memo = KeyMemo()
+        if key_memo and filename_hash is not get_default_filename:
+            raise ValueError('key_memo only applies to the default filename_hash.')
 
         def _cache(func: Callable) -> Callable:
             class CallableWrapper:
                 def __init__(_self, hash_func):
                     super().__init__()
-                    _self.filename_hash = hash_func
+                    # 使绑定到实例的方法也保留原函数的 __name__、__doc__ 及签名
+                    update_wrapper(_self, func)
+                    _self.filename_hash = key_memo.filename if key_memo else hash_func
                     _self.fine_cache = self
                     _self.agent = PickleAgent()
                     _self.in_dir = in_dir
+                    _self.key_memo = key_memo or None
+                    _self.hits = 0
+                    _self.misses = 0
 
                 @wraps(func)
                 def __call__(_self, *args, **kwargs):
@@ -85,18 +169,30 @@ class FineCache:
                     if os.path.exists(cache_location) and os.path.isfile(cache_location):
                         # 从缓存文件获取结果
                         logger.warning(f'Acquire cached {func.__qualname__} result from: {cache_location}')
+                        _self.hits += 1
                         result = _self.agent.get(call, cache_location)
                     else:
                         # 将运行结果缓存到缓存文件中
+                        _self.misses += 1
                         result = call.result
                         _self.agent.set(call, result, cache_location)
                     return result
 
+                def cache_info(_self) -> dict:
+                    """
+                    返回缓存的命中统计，启用key_memo时包含其命中率。
+                    """
+                    info = {'hits': _self.hits, 'misses': _self.misses}
+                    if _self.key_memo is not None:
+                        info['key_memo'] = _self.key_memo.info()
+                    return info
+
                 def __get__(self, instance, owner):
                     if instance is None:
                         return self
                     else:
-                        return types.MethodType(self.__call__, instance)
+                        # 绑定包装对象本身，使 instance.method.cache_info()、__name__ 等属性可以访问
+                        return types.MethodType(self, instance)
 
             return CallableWrapper(filename_hash)
 
@@ -1,12 +1,8 @@
 import logging
 
-logger = logging.getLogger(__name__)
-logger.setLevel(logging.INFO)
-console_handler = logging.StreamHandler()
-formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s', datefmt='%m-%d %H:%M:%S')
-console_handler.setFormatter(formatter)
-logger.addHandler(console_handler)
+# 不在导入时配置handler，由 FineCache 初始化时通过 utils.setup_logger 配置
+logging.getLogger(__name__).addHandler(logging.NullHandler())
 
 from .FineCache import FineCache
 from .CachedCall import CachedCall, PickleAgent
-from .utils import IncrementDir
+from .utils import IncrementDir, KeyMemo
@@ -1,13 +1,36 @@
 import hashlib
 import os
 import re
+import sys
+import weakref
+from collections import OrderedDict
 from pathlib import Path
-from typing import Optional
+from typing import Optional, Tuple, Dict, Any
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+_logger_configured = False
+
+
+def setup_logger():
+    """
+    为包的logger添加控制台输出。仅在首次调用时生效，不覆盖用户已设置的日志级别。
+    """
+    global _logger_configured
+    if _logger_configured:
+        return
+    _logger_configured = True
+    package_logger = logging.getLogger(__package__)
+    if package_logger.level == logging.NOTSET:
+        package_logger.setLevel(logging.INFO)
+    console_handler = logging.StreamHandler()
+    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s', datefmt='%m-%d %H:%M:%S')
+    console_handler.setFormatter(formatter)
+    package_logger.addHandler(console_handler)
+
+
 class HashFunc:
     @staticmethod
     def hash(x, hash_cls=hashlib.md5):
@@ -19,10 +42,157 @@ class HashFunc:
         return obj.hexdigest()
 
 
+def _hash_repr(x):
+    return HashFunc.hash(repr(x))
+
+
+class KeyMemo:
+    """
+    记忆参数的哈希值，重复传入同一个大对象时不再重新计算。
+
+    仅对以下对象生效，其它对象每次都重新计算：
+
+    - 不可变对象（类型恰为 str, bytes 及元素均不可变的 tuple/frozenset，不含子类），以强引用持有。
+    - torch.Tensor，以弱引用追踪，并通过其 `_version` 计数确认未被原地修改。
+      通过 `.data` 或 `.numpy()` 所做的修改不会增加 `_version`，因而无法被发现。
+
+    命中时仅按 `id` 查找并校验引用与版本，不会遍历对象。
+    `hits` 与 `misses` 只统计可记忆的参数，`hit_rate` 为 hits / (hits + misses)；
+    不可追踪或过小而直接重新计算的参数计入 `bypassed`。
+    """
+    SCALAR_TYPES = (int, float, complex, bool, type(None))
+
+    def __init__(self, maxsize: int = 1024, min_size: int = 64, hash_func=_hash_repr):
+        """
+        :param maxsize: 最多记忆的对象数量，超出时淘汰最久未使用的记录。
+            注意不可变对象以强引用持有，调用方释放后仍会驻留在内存中，直到被淘汰或调用 clear()。
+        :param min_size: 估计大小（str/bytes的长度、容器中元素大小之和、tensor的元素数）小于该值的对象不记忆，直接重新计算。
+        :param hash_func: 计算单个参数哈希值的函数。
+        """
+        self.maxsize = maxsize
+        self.min_size = min_size
+        self.hash_func = hash_func
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self._memo = OrderedDict()  # id(obj) -> (obj 或其弱引用, 是否弱引用, 版本, 哈希值)
+
+    @classmethod
+    def _immutable_size(cls, obj) -> Optional[int]:
+        """
+        :return: 不可变对象的大小估计，其它对象（包括不可变类型的子类）返回None。
+        """
+        obj_type = type(obj)
+        if obj_type in cls.SCALAR_TYPES or obj_type is range:
+            return 1
+        if obj_type in (str, bytes):
+            return len(obj)
+        if obj_type in (tuple, frozenset):
+            size = 0
+            for x in obj:
+                x_size = cls._immutable_size(x)
+                if x_size is None:
+                    return None
+                size += x_size
+            return size
+        return None
+
+    @staticmethod
+    def _tensor_version(obj) -> Optional[int]:
+        """
+        :return: torch.Tensor 的版本计数，其它对象返回None。不会主动导入torch。
+        """
+        torch = sys.modules.get('torch')
+        if torch is not None and isinstance(obj, torch.Tensor):
+            return obj._version
+        return None
+
+    def _track(self, obj) -> Optional[Tuple[bool, Optional[int]]]:
+        """
+        :return: (是否使用弱引用, 版本)。对象无法追踪或过小时返回None。
+        """
+        version = self._tensor_version(obj)
+        if version is not None:
+            weak, size = True, obj.numel()
+        else:
+            weak, size = False, self._immutable_size(obj)
+        if size is None or size < self.min_size:
+            return None
+        return weak, version
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def info(self) -> Dict[str, Any]:
+        return {'hits': self.hits, 'misses': self.misses, 'bypassed': self.bypassed, 'hit_rate': self.hit_rate,
+                'size': len(self._memo), 'maxsize': self.maxsize}
+
+    def clear(self):
+        self._memo.clear()
+        self.hits = self.misses = self.bypassed = 0
+
+    def _discard(self, key, ref):
+        entry = self._memo.get(key)
+        if entry is not None and entry[0] is ref:
+            del self._memo[key]
+
+    def hash(self, x) -> str:
+        """
+        计算单个参数的哈希值，对可追踪的对象复用已计算的结果。
+        """
+        if type(x) in self.SCALAR_TYPES:
+            self.bypassed += 1
+            return self.hash_func(x)
+        key = id(x)
+        entry = self._memo.get(key)
+        if entry is not None:
+            ref, weak, version, digest = entry
+            if weak:
+                hit = ref() is x and self._tensor_version(x) == version
+            else:
+                hit = ref is x
+            if hit:
+                self._memo.move_to_end(key)
+                self.hits += 1
+                return digest
+
+        track = self._track(x)
+        if track is None:
+            self.bypassed += 1
+            return self.hash_func(x)
+        weak, version = track
+        self.misses += 1
+        digest = self.hash_func(x)
+        if weak:
+            try:
+                ref = weakref.ref(x, lambda r, k=key: self._discard(k, r))
+            except TypeError:
+                return digest
+        else:
+            ref = x
+        self._memo[key] = (ref, weak, version, digest)
+        self._memo.move_to_end(key)
+        while len(self._memo) > self.maxsize:
+            self._memo.popitem(last=False)
+        return digest
+
+    def filename(self, func, *args, **kwargs):
+        """
+        与 get_default_filename 生成相同的文件名，但参数的哈希值经过记忆。
+        """
+        return _assemble_filename(func, args, kwargs, self.hash)
+
+
 def get_default_filename(func, *args, **kwargs):
+    return _assemble_filename(func, args, kwargs, _hash_repr)
+
+
+def _assemble_filename(func, args, kwargs, hash_arg):
     # TODO: 确保文件名长度不超限。
-    hash_args = [HashFunc.hash(repr(x)) for x in args]
-    hash_kwargs = {str(k): HashFunc.hash(repr(v)) for k, v in kwargs.items()}
+    hash_args = [hash_arg(x) for x in args]
+    hash_kwargs = {str(k): hash_arg(v) for k, v in kwargs.items()}
 
     str_args = ','.join(hash_args)
     str_kwargs = ','.join([f"{k}={v}" for k, v in hash_kwargs])
@@ -65,6 +235,13 @@ class IncrementDir:
         number_dirs = [(int(_id), d) for _id, d in dirs]
         return max(number_dirs, key=lambda x: x[0])
 
+    def match_name(self, name: str, *args, **kwargs) -> bool:
+        """
+        判断 name 是否为模板以 args 和 kwargs 填充后、任意 {id} 对应的文件名。
+        """
+        parts = [re.escape(p.format(*args, **kwargs)) for p in self.template.split('{id}')]
+        return re.fullmatch(r'\d+'.join(parts), name) is not None
+
     def new_name(self, *args, **kwargs):
         """
         args 和 kwargs 为模板字符串使用 str.format 的参数，不包括 {id} 参数。
@@ -0,0 +1,39 @@
+"""
+测量 `import FineCache` 与 `FineCache(...)` 构造的耗时。
+
+运行: python benchmarks/bench_init.py
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_time(repeat=10):
+    # 每次在新的解释器中导入，避免模块缓存的影响
+    code = 'import time; t = time.perf_counter(); import FineCache; print(time.perf_counter() - t)'
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    times = []
+    for _ in range(repeat):
+        result = subprocess.run([sys.executable, '-c', code], stdout=subprocess.PIPE, text=True, env=env, check=True)
+        times.append(float(result.stdout))
+    return min(times)
+
+
+def constructor_time(number=1000):
+    sys.path.insert(0, ROOT)
+    from FineCache import FineCache
+    with tempfile.TemporaryDirectory() as base_path:
+        construct = timeit.timeit(lambda: FineCache(base_path), number=number) / number
+        first_use = timeit.timeit(lambda: FineCache(base_path).dir, number=10) / 10
+    return construct, first_use
+
+
+if __name__ == '__main__':
+    construct, first_use = constructor_time()
+    print(f'import FineCache:         {import_time() * 1e3:.3f} ms')
+    print(f'FineCache(...):           {construct * 1e6:.3f} us')
+    print(f'FineCache(...).dir:       {first_use * 1e6:.3f} us')
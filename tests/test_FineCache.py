@@ -1,11 +1,19 @@
+import gc
+import inspect
 import json
+import logging
+import multiprocessing
 import os
 import pickle
+import sys
+import types
 import unittest
+from unittest import mock
 from pathlib import Path
 from shutil import rmtree
 
-from FineCache import FineCache, IncrementDir
+from FineCache import FineCache, IncrementDir, KeyMemo
+from FineCache.utils import get_default_filename
 
 
 def func(a1: int, a2: int, k1="v1", k2="v2"):
@@ -18,6 +26,19 @@ def func(a1: int, a2: int, k1="v1", k2="v2"):
     return a3, a4, kr1, kr2
 
 
+def _worker_dir(base_path, template="test{id}"):
+    return os.path.abspath(FineCache(base_path, template).dir)
+
+
+_fork_shared = {}
+
+
+def _fork_worker(i):
+    fc = _fork_shared['fc']
+    fc.cache()(func)(i, 1)
+    return os.path.abspath(fc.dir)
+
+
 class TestFineCache(unittest.TestCase):
     def setUp(self) -> None:
         self.base_path_name = '.cache'
@@ -109,6 +130,210 @@ class TestFineCache(unittest.TestCase):
         wrapped('a1', 'a2')
         self.assertTrue(os.path.exists(os.path.join(self.fc.dir, "test_func('x','y';).pk")))
 
+    # Test for lazy initialization
+    def test_lazy_init(self):
+        fc = FineCache(self.base_path_name)
+        self.assertFalse(os.path.exists(self.base_path_name))
+        self.assertNotIn('information', fc.__dict__)
+        exp_dir = fc.dir
+        self.assertTrue(os.path.exists(exp_dir))
+        self.assertIs(exp_dir, fc.dir)
+
+    def test_attach_env(self):
+        self.fc.export_env()
+        try:
+            with multiprocessing.get_context('spawn').Pool(1) as pool:
+                worker_dir = pool.apply(_worker_dir, (self.base_path_name,))
+                # 不在 base_path 下的对象不会挂载
+                other_dir = pool.apply(_worker_dir, ('.cache_other',))
+                # 模板不同的对象不会挂载
+                other_template_dir = pool.apply(_worker_dir, (self.base_path_name, 'other{id}'))
+        finally:
+            del os.environ[FineCache.ENV_KEY]
+            if os.path.exists('.cache_other'):
+                rmtree('.cache_other')
+        self.assertEqual(worker_dir, os.path.abspath(self.fc.dir))
+        self.assertNotEqual(other_dir, os.path.abspath(self.fc.dir))
+        self.assertNotEqual(other_template_dir, os.path.abspath(self.fc.dir))
+        self.assertEqual(sorted(os.listdir(self.base_path_name)), ['other1', 'test1'])
+        # 同一进程中新建的对象不会挂载
+        fc = FineCache(self.base_path_name, "test{id}")
+        self.assertNotEqual(os.path.abspath(fc.dir), os.path.abspath(self.fc.dir))
+
+    @unittest.skipUnless(hasattr(os, 'register_at_fork'), 'fork is not available')
+    def test_attach_fork(self):
+        # 父进程未使用过 dir 时 fork，子进程仍共享同一实验文件夹
+        base_path = os.path.join(self.base_path_name, 'fork')
+        fc = FineCache(base_path, "test{id}")
+        _fork_shared['fc'] = fc
+        try:
+            with multiprocessing.get_context('fork').Pool(3) as pool:
+                worker_dirs = pool.map(_fork_worker, range(6))
+        finally:
+            _fork_shared.clear()
+        self.assertEqual(set(worker_dirs), {os.path.abspath(fc.dir)})
+        self.assertEqual(os.listdir(base_path), ['test1'])
+
+    def test_logger_level(self):
+        package_logger = logging.getLogger('FineCache')
+        old_level = package_logger.level
+        try:
+            package_logger.setLevel(logging.DEBUG)
+            FineCache(self.base_path_name)
+            self.assertEqual(package_logger.level, logging.DEBUG)
+        finally:
+            package_logger.setLevel(old_level)
+
+    def test_attach_env_handle(self):
+        exp_dir = os.path.join(self.base_path_name, 'test1')
+        try:
+            # 模拟由其它进程导出的实验文件夹，挂载时也会创建 base_path
+            os.environ[FineCache.ENV_KEY] = f'{os.getpid() + 1}:{os.path.abspath(exp_dir)}'
+            fc = FineCache(self.base_path_name, "test{id}")
+            self.assertEqual(os.path.abspath(fc.dir), os.path.abspath(exp_dir))
+            self.assertTrue(os.path.isdir(self.base_path_name))
+            # 格式错误的环境变量被忽略
+            os.environ[FineCache.ENV_KEY] = 'malformed'
+            fc = FineCache(self.base_path_name, "test{id}")
+            self.assertNotEqual(os.path.abspath(fc.dir), os.path.abspath(exp_dir))
+        finally:
+            del os.environ[FineCache.ENV_KEY]
+
+    def test_key_memo(self):
+        memo = KeyMemo(maxsize=2)
+        table = tuple(range(1000))
+        self.assertEqual(memo.filename(func, table, 'v1', a2=3), get_default_filename(func, table, 'v1', a2=3))
+        self.assertEqual(memo.filename(func, table, 'v1', a2=3), get_default_filename(func, table, 'v1', a2=3))
+        self.assertEqual(memo.hits, 1)
+        self.assertEqual(memo.misses, 1)
+
+        # 可变对象不会被记忆
+        data = [1, 2]
+        memo.hash(data)
+        data.append(3)
+        self.assertEqual(memo.hash(data), get_default_filename(func, data)[len('func('):-len(';).pk')])
+        self.assertEqual(memo.hits, 1)
+
+        # 带有 `_version` 属性的普通对象不会被追踪
+        class Config:
+            _version = 2
+
+            def __init__(self):
+                self.lr = 0.1
+
+            def __repr__(self):
+                return f'Config({self.lr})'
+
+        cfg = Config()
+        h1 = memo.hash(cfg)
+        cfg.lr = 0.2
+        self.assertNotEqual(memo.hash(cfg), h1)
+        self.assertEqual(memo.hits, 1)
+
+        # 过小的对象不记忆，计入 bypassed
+        memo.hash('short')
+        self.assertNotIn(id('short'), memo._memo)
+        self.assertLessEqual(len(memo._memo), 2)
+        self.assertEqual(memo.info()['bypassed'], 9)
+
+    def test_key_memo_size(self):
+        memo = KeyMemo()
+        # 元素少但总体很大的 tuple 会被记忆
+        pair = ('a' * 1000, 'b' * 1000)
+        memo.hash(pair)
+        memo.hash(pair)
+        self.assertEqual((memo.hits, memo.misses, len(memo._memo)), (1, 1, 1))
+
+        # 不可变类型的子类不会被记忆
+        class Label(str):
+            def __repr__(self):
+                return f'Label({self.tag})'
+
+        label = Label('x' * 1000)
+        label.tag = 'a'
+        h1 = memo.hash(label)
+        label.tag = 'b'
+        self.assertNotEqual(memo.hash(label), h1)
+        self.assertEqual(memo.hits, 1)
+
+    def test_key_memo_tensor(self):
+        class Tensor:
+            def __init__(self, n):
+                self.values = list(range(n))
+                self._version = 0
+
+            def numel(self):
+                return len(self.values)
+
+            def add_(self, x):
+                self.values = [v + x for v in self.values]
+                self._version += 1
+
+            def __repr__(self):
+                return f'Tensor({self.values})'
+
+        memo = KeyMemo()
+        with mock.patch.dict(sys.modules, {'torch': types.SimpleNamespace(Tensor=Tensor)}):
+            tensor = Tensor(100)
+            h1 = memo.hash(tensor)
+            self.assertEqual(memo.hash(tensor), h1)
+            self.assertEqual((memo.hits, memo.misses), (1, 1))
+            # 原地修改后版本增加，重新计算
+            tensor.add_(1)
+            h2 = memo.hash(tensor)
+            self.assertNotEqual(h2, h1)
+            self.assertEqual((memo.hits, memo.misses), (1, 2))
+            # 元素数过少的 tensor 不记忆
+            memo.hash(Tensor(2))
+            self.assertEqual(memo.bypassed, 1)
+            # 对象被回收后，记录通过弱引用回调移除
+            self.assertEqual(len(memo._memo), 1)
+            del tensor
+            gc.collect()
+            self.assertEqual(len(memo._memo), 0)
+
+    def test_key_memo_hit_not_walk(self):
+        memo = KeyMemo()
+        table = tuple(range(1000))
+        memo.hash(table)
+        with mock.patch.object(KeyMemo, '_immutable_size', side_effect=AssertionError('walked')), \
+                mock.patch.object(KeyMemo, '_track', side_effect=AssertionError('tracked')):
+            self.assertEqual(memo.hash(table), get_default_filename(func, table)[len('func('):-len(';).pk')])
+        self.assertEqual(memo.hits, 1)
+
+    def test_key_memo_cache_info(self):
+        def lookup(table, i):
+            return table[i]
+
+        wrapped = self.fc.cache(key_memo=True)(lookup)
+        table = tuple(range(100))
+        for _ in range(3):
+            self.assertEqual(wrapped(table, 1), 1)
+        info = wrapped.cache_info()
+        self.assertEqual(info['hits'], 2)
+        self.assertEqual(info['misses'], 1)
+        self.assertEqual(info['key_memo']['hits'], 2)
+        self.assertAlmostEqual(info['key_memo']['hit_rate'], 2 / 3)
+        self.assertRaises(ValueError, self.fc.cache, lambda f, *a, **kw: 'x.pk', key_memo=True)
+
+    def test_cache_info_method(self):
+        fc = self.fc
+
+        class Loader:
+            @fc.cache(key_memo=True)
+            def lookup(self, table, i):
+                return table[i]
+
+        loader = Loader()
+        table = tuple(range(100))
+        loader.lookup(table, 1)
+        loader.lookup(table, 1)
+        self.assertEqual(loader.lookup.cache_info()['key_memo']['hits'], 1)
+        self.assertEqual(loader.lookup.cache_info(), Loader.lookup.cache_info())
+        # 绑定到实例的方法保留原函数的名称与签名
+        self.assertEqual(loader.lookup.__name__, 'lookup')
+        self.assertEqual(list(inspect.signature(loader.lookup).parameters), ['table', 'i'])
+
     # Test for Record
 
     def test_record_output(self):